@@ -9,6 +9,7 @@ setup(name='tbsU',
       author_email='tbs@tylerbs.com',
       license='AGPLv3',
       packages=find_packages(),
+      python_requires='>=3.7',
       install_requires=[
         'tabulate',
         'pandas',
@@ -16,7 +17,7 @@ setup(name='tbsU',
         'sqlalchemy',
       ],
       classifiers=[
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "License :: OSI Approved :: MIT License",
       ]
       )
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 
-# Load Modules
-import tbsU.alerts
-import tbsU.sql
-import tbsU.dfclean
-import tbsU.potpourri
+# Load Modules lazily: each submodule (and the heavy packages it needs) is only imported the first
+# time it is accessed, e.g. tbsU.sql
+import importlib
 
+__all__ = ['alerts', 'sql', 'dfclean', 'potpourri']
 
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f'{__name__}.{name}')
+        globals()[name] = module
+        return module
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -7,9 +7,6 @@ Provides functionality for monitoring scripts and sending alerts through slack.
 import functools
 import json
 import os
-import requests
-
-from tabulate import tabulate
 
 #####################################
 # Classes                           #
@@ -48,6 +45,9 @@ default_alerters = {
     'dinosaur': ['Rex', ':t-rex:'],
 }
 
+# Slack splits anything longer than this into several messages, mangling code blocks
+slack_msg_limit = 4000
+
 
 #####################################
 # Helper Functions                 #
@@ -64,6 +64,129 @@ def _alerters_conflict(stored, new_alerters):
     return ('n' in check.lower())
 
 
+def _init_storage():
+    ''' Creates the alerter and channel storage files the first time they are needed '''
+    if not os.path.isfile(alerters_file):
+        store_alerter(default=True)
+
+    if not os.path.isfile(slack_channels_file):
+        store_channel({})
+
+
+def _select_rows(df, rows, how, sort_by):
+    ''' Cuts the dataframe down to the rows to be shown before any formatting happens '''
+    if rows is None or len(df.index) <= rows:
+        return df
+    if how == 'head':
+        return df.head(rows)
+    elif how == 'tail':
+        return df.tail(rows)
+    elif how in ['top', 'bottom']:
+        if sort_by is None:
+            raise ValueError(f"'sort_by' must be provided when how='{how}'")
+        # nlargest/nsmallest only take numeric columns; anything else falls back to a full sort
+        try:
+            if how == 'top':
+                return df.nlargest(rows, sort_by)
+            return df.nsmallest(rows, sort_by)
+        except TypeError:
+            return df.sort_values(sort_by, ascending=(how == 'bottom')).head(rows)
+    else:
+        raise ValueError("'how' must be one of ['head', 'tail', 'top', 'bottom']")
+
+
+def _cell_strings(col):
+    '''
+    Formats a column the way tabulate does, all at once: floats in 'g' format and missing values
+    as blanks. Newlines become spaces so every row stays on one line.
+    '''
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_float_dtype(col):
+        values = np.char.mod('%g', col.to_numpy(dtype=float, na_value=np.nan))
+        strs = pd.Series(values, index=col.index, dtype=object)
+    else:
+        strs = col.astype(str).str.replace(r'\r?\n', ' ', regex=True)
+    return strs.mask(col.isna(), '')
+
+
+def _psql_lines(df, max_width):
+    '''
+    Renders a dataframe in the psql table format, one column at a time. Column widths come from
+    vectorized string lengths rather than per-cell python, and every row has the same width.
+    Columns that would take a row past max_width are left off. Returns the (header_lines,
+    body_lines, footer_lines, number of columns left off).
+    '''
+    import pandas as pd
+
+    # The index is pulled out level by level so it can share names with columns
+    positions = pd.RangeIndex(len(df.index))
+    cells = [df.index.get_level_values(i).to_series(index=positions)
+             for i in range(df.index.nlevels)]
+    cells += [df.iloc[:, i].reset_index(drop=True) for i in range(len(df.columns))]
+    headers = [str(n) if n is not None else '' for n in df.index.names]
+    headers += [str(c) for c in df.columns]
+    headers = [' '.join(head.splitlines()) for head in headers]
+
+    widths = []
+    cols = []
+    line_width = 1
+    for col, head in zip(cells, headers):
+        strs = _cell_strings(col)
+        width = max(len(head), int(strs.str.len().max()) if len(strs) else 0)
+        if cols and line_width + width + 3 > max_width:
+            break
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            strs, head = strs.str.rjust(width), head.rjust(width)
+        else:
+            strs, head = strs.str.ljust(width), head.ljust(width)
+        widths.append(width)
+        cols.append(' ' + strs + ' ')
+        headers[len(cols) - 1] = f' {head} '
+        line_width += width + 3
+
+    dashes = ['-' * (w + 2) for w in widths]
+    border = '+' + '+'.join(dashes) + '+'
+    header_lines = [border, '|' + '|'.join(headers[:len(cols)]) + '|',
+                    '|' + '+'.join(dashes) + '|']
+
+    if len(positions):
+        body_lines = ('|' + cols[0].str.cat(cols[1:], sep='|') + '|').tolist()
+    else:
+        body_lines = []
+
+    return header_lines, body_lines, [border], len(cells) - len(cols)
+
+
+def _chunk_lines(title, header_lines, body_lines, footer_lines, max_chars):
+    ''' Packs table lines into code-block messages of at most max_chars, repeating the header '''
+    fence = '\n```'
+    head = '\n'.join(header_lines)
+    foot = '\n'.join(footer_lines)
+    # fences, header, footer, the newlines joining them and room for a '(cont. i/n)' suffix
+    overhead = len(fence) * 2 + len(head) + len(foot) + 2 + len(' (cont. 000/000)')
+
+    msgs = []
+    chunk = []
+    size = overhead + len(title)
+    for line in body_lines:
+        if chunk and size + len(line) + 1 > max_chars:
+            msgs.append(chunk)
+            chunk = []
+            size = overhead + len(title)
+        chunk.append(line)
+        size += len(line) + 1
+    msgs.append(chunk)
+
+    out = []
+    for i, chunk in enumerate(msgs):
+        msg_title = title if i == 0 else f'{title} (cont. {i + 1}/{len(msgs)})'
+        table = '\n'.join(filter(None, [head, '\n'.join(chunk), foot]))
+        out.append(fence.join([msg_title, table, '']))
+    return out
+
+
 def _mothball_alerter(a):
     if isinstance(a, list):
         return a
@@ -79,12 +202,14 @@ def _mothball_alerter(a):
 #####################################
 
 def alerters():
+    _init_storage()
     adict = json.load(open(alerters_file))
     out = {k: Alerter(v[0], v[1]) for k, v in adict.items()}
     return out
 
 
 def channels():
+    _init_storage()
     cdict = json.load(open(slack_channels_file))
     return cdict 
 
@@ -116,6 +241,7 @@ def delete_channel(channels):
     channels: string or array-like
         List of channels to delete
     '''
+    _init_storage()
     stored = json.load(open(slack_channels_file))
 
     if isinstance(channels, str):
@@ -140,8 +266,9 @@ def store_alerter(new_alerters={}, default=False):
     try:
         stored = json.load(open(alerters_file))
     except (NameError, FileNotFoundError):
+        # New storage always starts with the package defaults
         print('No stored alerters found. Creating storage...')
-        stored = {}
+        stored = {k: list(v) for k, v in default_alerters.items()}
 
     if default:
         new_alerters = default_alerters
@@ -163,6 +290,7 @@ def delete_alerter(alerter_ids):
     alerter_ids: string or array-like
         list of alerter_ids to delete from storage
     '''
+    _init_storage()
     stored = json.load(open(alerters_file))
 
     if isinstance(alerter_ids, str):
@@ -175,14 +303,89 @@ def delete_alerter(alerter_ids):
         json.dump(stored, outfile)
 
 
-def slack_msg_df(text, df, tablefmt='psql'):
-    title = text
-    body = tabulate(df, headers='keys', tablefmt=tablefmt)
-    return '\n```'.join([title, body, ''])
+def slack_msgs_df(text, df, tablefmt='psql', rows=50, how='head', sort_by=None, summary=False,
+                  summary_rows=100000, max_chars=slack_msg_limit):
+    '''
+    Renders a dataframe as one or more slack messages, each small enough to be posted on its own.
+    Only the rows to be shown are ever formatted, so this stays fast for very large dataframes.
+
+    Parameters
+    ----------
+    text : string
+        Title for the message. Continuation messages get a '(cont. i/n)' suffix.
+    df : pandas dataframe
+        The dataframe to render
+    tablefmt : string, optional (default 'psql')
+        Any tabulate table format. 'psql' is rendered natively and repeats its header in every
+        message; other formats go through tabulate.
+    rows : int, optional (default 50)
+        Maximum number of rows to show. None shows every row.
+    how : {'head', 'tail', 'top', 'bottom'}, optional
+        Which rows to show when the dataframe is longer than 'rows'. 'top' and 'bottom' take the
+        largest/smallest rows by 'sort_by'.
+    sort_by : string or list, optional
+        Column(s) used to rank rows for how='top' or how='bottom'
+    summary : Boolean, optional (default False)
+        If True, sends describe-style stats for each column instead of the rows themselves
+    summary_rows : int, optional (default 100000)
+        Longer dataframes are summarized from a random sample of this many rows
+    max_chars : int, optional
+        Maximum length of each message. psql columns that don't fit are left off and other
+        formats have their lines cut short.
+
+    Returns
+    -------
+    list of strings
+    '''
+    from tabulate import tabulate
+
+    text = text[:max_chars // 4]
+    n_obs = len(df.index)
+    if summary:
+        if n_obs > summary_rows:
+            df = df.sample(summary_rows, random_state=0)
+            text = f'{text} (summary of a {summary_rows:,} row sample of {n_obs:,} rows)'
+        else:
+            text = f'{text} (summary of {n_obs:,} rows)'
+        df = df.describe(include='all').T
+    elif rows is not None and n_obs > rows:
+        df = _select_rows(df, rows, how, sort_by)
+        text = f'{text} ({how} {rows:,} of {n_obs:,} rows)'
+
+    # The header, footer and at least one row have to fit alongside the title, fences and any
+    # notes added to the title below
+    max_width = max((max_chars - len(text) - 80) // 5, 1)
+
+    if tablefmt == 'psql':
+        header_lines, body_lines, footer_lines, left_off = _psql_lines(df, max_width)
+        if left_off:
+            text = f'{text} ({left_off:,} columns not shown)'
+    else:
+        header_lines, footer_lines = [], []
+        body_lines = tabulate(df, headers='keys', tablefmt=tablefmt).split('\n')
+
+    lines = [header_lines, body_lines, footer_lines]
+    header_lines, body_lines, footer_lines = [[i[:max_width] for i in j] for j in lines]
+
+    return _chunk_lines(text, header_lines, body_lines, footer_lines, max_chars)
+
+
+def slack_msg_df(text, df, tablefmt='psql', **kwargs):
+    '''
+    Renders a dataframe as a single slack message. Takes the same options as slack_msgs_df, so by
+    default only the first 50 rows are shown (rows=None shows them all). If the table still needs
+    more than one message, only the first is returned, ending with a '(truncated)' note; use
+    slack_msgs_df or alert_df to get all of them.
+    '''
+    msgs = slack_msgs_df(text, df, tablefmt=tablefmt, **kwargs)
+    if len(msgs) > 1:
+        return msgs[0] + '\n(truncated)'
+    return msgs[0]
 
 
 def alert(text, channel=None, alerter=None, webhook_key=None):
     ''' Sends an alert usings guitly spark to a slack channel '''
+    import requests
 
     if not webhook_key:
         if not channel:
@@ -203,6 +406,15 @@ def alert(text, channel=None, alerter=None, webhook_key=None):
     return requests.post(webhook_key, data=payload, headers=header)
 
 
+def alert_df(text, df, channel=None, alerter=None, webhook_key=None, **kwargs):
+    '''
+    Sends a dataframe to a slack channel, split over as many messages as needed. Keyword arguments
+    are passed through to slack_msgs_df.
+    '''
+    msgs = slack_msgs_df(text, df, **kwargs)
+    return [alert(msg, channel, alerter, webhook_key) for msg in msgs]
+
+
 def alert_monitor(text, channel=None, alerter=None, webhook_key=None):
     ''' 
     a decorator for monitoring functions 
@@ -230,23 +442,3 @@ def alert_monitor(text, channel=None, alerter=None, webhook_key=None):
         return wrapper
 
     return func_decorator
-
-
-#####################################
-# Initialize                        #
-#####################################
-
-if not os.path.isfile(alerters_file):
-    store_alerters(default=True)
-
-if not os.path.isfile(alerters_file):
-    store_channel({})
-
-
-
-
-
-
-
-
-
@@ -1,8 +1,17 @@
 import base64
 import datetime
+import numpy as np
 import pandas as pd
 import re
 
+_b64_alphabet = np.frombuffer(
+    b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_', dtype=np.uint8
+)
+_b64_lookup = np.full(256, -1, dtype=np.int64)
+_b64_lookup[_b64_alphabet] = np.arange(64)
+_epoch_rebase = 1420070400  # seconds from 1925-01-01 to 1970-01-01
+
+
 def camel2snake(string):
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', string)
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
@@ -46,8 +55,69 @@ def decode64_epoch(string, format_pandas=True):
     return out
 
 
+def encode64_epoch_array(dts):
+    '''
+    Vectorized encode64_epoch. Takes a datetime Series or array-like and returns the same 
+    6-character strings, as a Series for Series input and an object array otherwise. NaT and None
+    become None. Naive datetimes are treated as UTC, as they are for pandas Timestamps.
+    '''
+    values = pd.to_datetime(dts if isinstance(dts, pd.Series) else pd.Series(dts))
+    if values.dt.tz is not None:
+        values = values.dt.tz_convert(None)
+
+    missing = values.isna().to_numpy()
+    ns = values.to_numpy(dtype='datetime64[ns]').view(np.int64)[~missing]
+
+    # Timestamp.timestamp() rounds to microseconds and int() then truncates towards zero
+    seconds = np.trunc(np.round(ns / 1e9, 6)).astype(np.int64) + _epoch_rebase
+    if ((seconds < 0) | (seconds >= 2**32)).any():
+        raise OverflowError('encode64_epoch only supports dates from 1925 to ~2061')
 
+    # 4 big-endian bytes are 32 bits; the first 6 base64 characters cover those plus 4 zero bits
+    bits = seconds.astype(np.uint64) << np.uint64(4)
+    shifts = np.arange(30, -1, -6, dtype=np.uint64)
+    codes = _b64_alphabet[(bits[:, None] >> shifts) & np.uint64(63)]
 
+    out = np.full(len(missing), None, dtype=object)
+    out[~missing] = np.ascontiguousarray(codes).view('S6').ravel().astype('U6')
 
+    if isinstance(dts, pd.Series):
+        return pd.Series(out, index=dts.index, name=dts.name, dtype=object)
+    return out
 
 
+def decode64_epoch_array(strings, format_pandas=True):
+    '''
+    Vectorized decode64_epoch. Takes a Series or array-like of strings produced by encode64_epoch
+    and returns a Series for Series input and an array otherwise. Missing values become NaT, or
+    None when format_pandas is False (in which case datetime.datetime objects are returned).
+    '''
+    values = strings if isinstance(strings, pd.Series) else pd.Series(strings, dtype=object)
+    missing = values.isna().to_numpy()
+    present = values.to_numpy(dtype=object)[~missing].astype('U')
+
+    if (np.char.str_len(present) != 6).any():
+        raise ValueError('decode64_epoch strings must be 6 characters long')
+
+    alphabet_err = 'Found characters outside of the URL-safe base64 alphabet'
+    try:
+        encoded = present.astype('S6')
+    except UnicodeEncodeError:
+        raise ValueError(alphabet_err)
+
+    codes = _b64_lookup[encoded.view(np.uint8).reshape(-1, 6)]
+    if (codes < 0).any():
+        raise ValueError(alphabet_err)
+
+    # 36 bits of characters; the trailing 4 are padding from the 32-bit encoding
+    shifts = np.arange(30, -1, -6, dtype=np.int64)
+    epoch = np.full(len(missing), np.iinfo(np.int64).min, dtype=np.int64)
+    epoch[~missing] = ((codes << shifts).sum(axis=1) >> 4) - _epoch_rebase
+
+    out = epoch.view('datetime64[s]').astype('datetime64[ns]')
+    if not format_pandas:
+        out = out.astype('datetime64[us]').astype(object)  # NaT comes out as None
+
+    if isinstance(strings, pd.Series):
+        return pd.Series(out, index=strings.index, name=strings.name, dtype=out.dtype)
+    return out
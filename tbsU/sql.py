@@ -7,12 +7,161 @@ fast! For right now, only supports psql.
 
 from datetime import datetime
 from io import StringIO
+import json
+import mmap
 import os
+import uuid
 
 import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine
 
+#####################################
+# Classes                           #
+#####################################
+
+class PGLoadSession:
+    '''
+    Loads many dataframes into Postgres over a single connection. The existing columns of every
+    table are looked up with one information_schema query, the loads can share one transaction and
+    grants are applied in bulk at the end, so each extra table costs little more than its COPY.
+
+    Parameters
+    ----------
+    engine : sql_alchemy engine, optional
+        Engine defining the connection to the database. Uses tbsu environment variables by default.
+    transaction : Boolean, optional (default True)
+        If True, every table is loaded in one transaction, so either all of them land or none do.
+        If False, each table is swapped in, granted and committed as soon as it is loaded, and
+        taken off the queue, so calling load() again after a failure only retries the rest.
+    grant : string or array-like, optional
+        Default permission group, or list of permission groups, for every table in the session
+    grant_types : string or array-like, optional (default 'SELECT')
+        Default types of access to grant
+
+    e.g:
+
+    with PGLoadSession(grant='analysts') as session:
+        session.add(df_users, 'users')
+        session.add(df_events, 'events', conflict='append')
+    '''
+
+    def __init__(self, engine=None, transaction=True, grant=None, grant_types='SELECT'):
+        if engine is None:
+            engine = _default_engine()
+
+        if engine is None:
+            raise ValueError('No tbsu default engine. Please provide an sql_alchemy engine.')
+
+        self.engine = engine
+        self.transaction = transaction
+        self.grant = grant
+        self.grant_types = grant_types
+        self.loads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.load()
+        return False
+
+    def add(self, df, table_name, conflict='fail', dupes='include', dupe_keys=[], dedupe_range={},
+            grant=None, grant_types=None):
+        '''
+        Queues a dataframe to be loaded. Arguments are as in df_to_pg; grant and grant_types
+        default to the session's.
+        '''
+        _check_load_args(conflict, dupes, dupe_keys)
+
+        self.loads.append({
+            'df': df,
+            'table_name': table_name,
+            'conflict': conflict,
+            'dupes': dupes,
+            'dupe_keys': dupe_keys,
+            'dedupe_range': dedupe_range,
+            'grant': _listify(self.grant if grant is None else grant),
+            'grant_types': _listify(self.grant_types if grant_types is None else grant_types),
+        })
+
+    def load(self):
+        '''
+        Loads every queued dataframe, applies the grants and empties the queue. Returns a dict of 
+        {table_name: number of rows loaded}.
+        '''
+        if not self.loads:
+            return {}
+
+        raw = self.engine.raw_connection()
+        curs = raw.cursor()
+
+        try:
+            catalog = _catalog_columns(curs, [i['table_name'] for i in self.loads])
+            added = {}
+            grants = {}
+            shadows = {}
+
+            for load in list(self.loads):
+                table_name = load['table_name']
+
+                # Replacements load into a shadow table that is swapped in by _finish_loads. Until
+                # then, later loads of the same table in this session go into the shadow as well.
+                replace = load['conflict'] == 'replace' and table_name in catalog
+                if replace:
+                    # The shadow goes next to the live table so the swap can't move schemas
+                    target = f'{_qualified_name(curs, table_name)}__new'
+                    curs.execute(f"DROP TABLE IF EXISTS {target};")
+                    shadows.pop(table_name, None)
+                else:
+                    target = shadows.get(table_name, table_name)
+
+                added_obs = _load_df(curs, self.engine, load['df'], target,
+                                     None if replace else catalog.get(table_name),
+                                     load['conflict'], load['dupes'], load['dupe_keys'],
+                                     load['dedupe_range'], unlogged=replace)
+
+                # A replace creates its table even when empty
+                created = added_obs or load['conflict'] == 'replace'
+
+                if replace:
+                    added[table_name] = added_obs
+                    shadows[table_name] = target
+                    catalog[table_name] = list(load['df'].columns)
+
+                else:
+                    added[table_name] = added.get(table_name, 0) + added_obs
+                    if created:
+                        # later loads of the same table in this session should see it
+                        catalog.setdefault(table_name, list(load['df'].columns))
+
+                if created and load['grant']:
+                    key = (tuple(load['grant_types']), tuple(load['grant']))
+                    tables = grants.setdefault(key, [])
+                    if table_name not in tables:
+                        tables.append(table_name)
+
+                # Without a shared transaction each table is finished, granted and committed on its
+                # own, so a later failure neither strands its grants nor loads it again on retry
+                if not self.transaction:
+                    _finish_loads(curs, shadows, grants)
+                    raw.commit()
+                    self.loads.pop(0)
+
+            _finish_loads(curs, shadows, grants)
+            raw.commit()
+            self.loads = []
+            return added
+
+        except:
+            raw.rollback()
+            raise
+
+        finally:
+            raw.close()
+
+
 #####################################
 # Helper Functions                  #
 #####################################
@@ -20,7 +169,257 @@ from sqlalchemy import create_engine
 def _add_cols(df, needed_cols):
     return dict((i, np.nan) for i in needed_cols if i not in df.columns)
 
-def _dedupe_ignore(df, dupe_keys, dedupe_range, table_name, engine):
+def _check_load_args(conflict, dupes, dupe_keys):
+    if dupes != 'include' and len(dupe_keys) == 0:
+        raise ValueError("Cannot dedupe: no dupe_keys provided")
+
+    if conflict not in ['replace', 'append', 'fail']:
+        raise ValueError("'conflict' must be one of ['replace', 'append', 'fail']")
+
+def _listify(item):
+    if item is None:
+        return []
+    if isinstance(item, str):
+        return [item]
+    return list(item)
+
+def _catalog_columns(curs, table_names):
+    '''
+    Looks up the columns of all of table_names with a single information_schema query. Returns a
+    dict of {table_name: [columns]}, leaving out tables that don't exist. Unqualified names resolve
+    through the search_path, as they would in a query.
+    '''
+    sql = '''
+        select table_schema, table_name, column_name,
+               table_schema = any(current_schemas(false)) as visible
+            from information_schema.columns
+            where table_name = any(%(tables)s)
+            order by array_position(current_schemas(false), table_schema::name), ordinal_position
+    '''
+    curs.execute(sql, {'tables': list({t.lower().split('.')[-1] for t in table_names})})
+
+    columns = {}
+    visible_schema = {}
+    for schema, table, column, visible in curs.fetchall():
+        columns.setdefault((schema, table), []).append(column)
+        if visible:
+            visible_schema.setdefault(table, schema)
+
+    out = {}
+    for name in table_names:
+        parts = name.lower().split('.')
+        key = tuple(parts) if len(parts) == 2 else (visible_schema.get(parts[-1]), parts[-1])
+        if key in columns:
+            out[name] = columns[key]
+    return out
+
+def _load_df(curs, engine, df, table_name, server_cols, conflict, dupes, dupe_keys, dedupe_range,
+             unlogged=False):
+    '''
+    Creates table_name if needed and COPYs the dataframe into it on an open cursor, without
+    committing. server_cols are the columns of the existing table, or None if there isn't one.
+    unlogged creates the table as UNLOGGED. A replace creates the table even for an empty
+    dataframe, so the old rows don't survive. Returns the number of rows loaded.
+    '''
+    # Handle if table already exists
+    if server_cols is not None:
+        if conflict == 'fail':
+            raise AssertionError("Table already exits")
+
+        elif conflict == 'append':
+
+            # Account for differences in columns
+            if (set(df.columns) <= set(server_cols)):
+                df = df.assign(**_add_cols(df, server_cols))
+
+            else: 
+                raise ValueError('Columns found that do not exist in existing sql table.'
+                                 + 'Please regenerate table with full set.')
+
+            # Dedupe
+            if dupes == 'ignore':
+                df = _dedupe_ignore(df, dupe_keys, dedupe_range, table_name, curs)
+
+            if dupes == 'update':
+                raise ValueError("Sorry, this isn't implemented yet :/")
+
+    added_obs = len(df.index)
+    if added_obs == 0 and not (conflict == 'replace' and server_cols is None):
+        print(f'No observations in df for {table_name}.')
+        return 0
+
+    #prep data for load
+    data = StringIO()
+    df.to_csv(data, header=False, index=False, sep='\u0005')
+    data.seek(0)
+
+    #create table with correct types
+    if server_cols is None:
+        empty_table = pd.io.sql.get_schema(df, table_name, con=engine)
+        empty_table = empty_table.replace('"', '')
+        if unlogged:
+            empty_table = empty_table.replace('CREATE TABLE', 'CREATE UNLOGGED TABLE', 1)
+        curs.execute(empty_table)
+
+    #populate the table
+    cols = ', '.join(df.columns)
+    sql_code = f"COPY {table_name}({cols}) FROM STDIN WITH CSV DELIMITER E'\x05';"
+    curs.copy_expert(sql=sql_code, file=data)
+
+    return added_obs
+
+def _finish_loads(curs, shadows, grants):
+    '''
+    Indexes and swaps in the session's shadow tables, then applies its grants in bulk. Both dicts
+    are emptied once done.
+    '''
+    # Index the shadows once all their rows are in, so the swaps only hold locks briefly
+    swaps = []
+    for table_name, shadow in shadows.items():
+        curs.execute(f"ALTER TABLE {shadow} SET LOGGED;")
+        swaps.append((table_name, shadow, _shadow_indexes(curs, table_name, shadow)))
+
+    for table_name, shadow, index_renames in swaps:
+        _swap_table(curs, table_name, shadow, index_renames)
+
+    for (grant_types, grant), tables in grants.items():
+        curs.execute(
+            f"GRANT {', '.join(grant_types)} ON {', '.join(tables)} TO {', '.join(grant)} ;"
+        )
+
+    shadows.clear()
+    grants.clear()
+
+def _shadow_indexes(curs, table_name, shadow):
+    '''
+    Rebuilds the indexes and key constraints of table_name on its freshly loaded shadow table,
+    named with a '__new' suffix. Building them after the load is much faster than maintaining them
+    row by row. Indexes on columns the shadow no longer has are skipped; any other failure, such
+    as duplicate keys, raises. Returns a list of (schema, shadow_index, index) names to rename once
+    the shadow is swapped in.
+    '''
+    sql = '''
+        select attname::text
+            from pg_attribute
+            where attrelid = %(shadow)s::regclass and attnum > 0 and not attisdropped
+    '''
+    curs.execute(sql, {'shadow': shadow})
+    shadow_cols = {i[0] for i in curs.fetchall()}
+
+    # Key columns come from indkey; columns used in expressions or predicates from pg_depend
+    sql = '''
+        select n.nspname, i.relname, pg_get_indexdef(i.oid), c.conname, pg_get_constraintdef(c.oid),
+               array(
+                   select a.attname::text
+                       from pg_attribute a
+                       where a.attrelid = x.indrelid
+                           and a.attnum > 0
+                           and (a.attnum = any(x.indkey::int2[])
+                                or a.attnum in (select d.refobjsubid
+                                                    from pg_depend d
+                                                    where d.classid = 'pg_class'::regclass
+                                                        and d.objid = x.indexrelid
+                                                        and d.refobjid = x.indrelid))
+               )
+            from pg_index x
+            join pg_class i on i.oid = x.indexrelid
+            join pg_namespace n on n.oid = i.relnamespace
+            left join pg_constraint c on c.conindid = x.indexrelid and c.contype in ('p', 'u', 'x')
+            where x.indrelid = %(table)s::regclass
+    '''
+    curs.execute(sql, {'table': table_name})
+
+    renames = []
+    for schema, index, index_def, constraint, constraint_def, index_cols in curs.fetchall():
+        if not set(index_cols) <= shadow_cols:
+            print(f'Index {index} uses columns the new {table_name} does not have. Skipping.')
+            continue
+
+        if constraint:
+            curs.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {constraint}__new {constraint_def};")
+        else:
+            unique = 'UNIQUE ' if index_def.startswith('CREATE UNIQUE') else ''
+            using = index_def.split(' USING ', 1)[1]
+            curs.execute(f"CREATE {unique}INDEX {index}__new ON {shadow} USING {using};")
+        renames.append((schema, f'{index}__new', index))
+
+    return renames
+
+def _qualified_name(curs, table_name):
+    '''
+    Resolves table_name through the search_path to 'schema.table', the same table that DDL on the
+    unqualified name would hit
+    '''
+    sql = '''
+        select n.nspname, c.relname
+            from pg_class c
+            join pg_namespace n on n.oid = c.relnamespace
+            where c.oid = %(table)s::regclass
+    '''
+    curs.execute(sql, {'table': table_name})
+    return '.'.join(curs.fetchone())
+
+def _swap_table(curs, table_name, shadow, index_renames):
+    '''
+    Replaces table_name with its shadow table and gives the shadow's indexes their old names. The
+    old table is dropped without cascade, so views or foreign keys that depend on it make the swap
+    fail instead of silently disappearing.
+    '''
+    curs.execute(f"DROP TABLE {table_name};")
+    curs.execute(f"ALTER TABLE {shadow} RENAME TO {table_name.split('.')[-1]};")
+    for schema, shadow_index, index in index_renames:
+        curs.execute(f"ALTER INDEX {schema}.{shadow_index} RENAME TO {index};")
+
+def _write_manifest(spill_dir, manifest):
+    ''' Writes the manifest of a resumable load, replacing the old one atomically '''
+    manifest_file = os.path.join(spill_dir, 'manifest.json')
+    with open(manifest_file + '.tmp', 'w') as outfile:
+        json.dump(manifest, outfile)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+def _spill_df(df, table_name, staging, conflict, spill_dir, chunk_rows, engine):
+    '''
+    Serializes the dataframe once into numbered chunk files in spill_dir, writing each slice
+    straight to disk, and returns the manifest describing them.
+    '''
+    os.makedirs(spill_dir, exist_ok=True)
+
+    chunks = []
+    chunk_sizes = []
+    for i, start in enumerate(range(0, len(df.index), chunk_rows)):
+        chunk = f'chunk_{i:05d}.csv'
+        piece = df.iloc[start:start + chunk_rows]
+        piece.to_csv(os.path.join(spill_dir, chunk), header=False, index=False, sep='\u0005')
+        chunks.append(chunk)
+        chunk_sizes.append(len(piece.index))
+
+    create_sql = pd.io.sql.get_schema(df, staging, con=engine).replace('"', '')
+    manifest = {
+        'load_id': uuid.uuid4().hex,
+        'table_name': table_name,
+        'staging_table': staging,
+        'conflict': conflict,
+        'columns': [str(c) for c in df.columns],
+        'rows': len(df.index),
+        'create_sql': create_sql.replace('CREATE TABLE', 'CREATE UNLOGGED TABLE', 1),
+        'chunks': chunks,
+        'chunk_sizes': chunk_sizes,
+        'committed': 0,
+    }
+    _write_manifest(spill_dir, manifest)
+    return manifest
+
+def _default_engine():
+    ''' Returns the tbsU engine, creating it from the environment variables on first use '''
+    if dw_engine is None and dw_host and dw_user and dw_name:
+        set_tbsU_engine(dw_host, dw_user, dw_name)
+    return dw_engine
+
+def _dedupe_ignore(df, dupe_keys, dedupe_range, table_name, curs):
+    '''
+    Drops rows whose dupe_keys already exist in table_name. The keys are read on the load's own
+    cursor, so tables loaded earlier in the same uncommitted session are seen too.
+    '''
     keylist_sql = ', '.join(dupe_keys)
     range_str = ''
     if len(dedupe_range) != 0:
@@ -40,7 +439,8 @@ def _dedupe_ignore(df, dupe_keys, dedupe_range, table_name, engine):
         keylist_sql=keylist_sql
     )
 
-    check = psql_load(sql, engine=engine)
+    curs.execute(sql)
+    check = pd.DataFrame.from_records(curs.fetchall(), columns=dupe_keys, coerce_float=True)
 
     # The index naming may come back to bite me at some point...
     keep_inds = (df[dupe_keys]
@@ -71,7 +471,7 @@ def sql_time(time, offset=0, offset_unit='days'):
 def psql_load(code, engine=None, db='', host='', user=''):
     ''' Allows a flexible draw from a database into pandas directly using a select statement '''
     if engine is None:
-        engine = dw_engine
+        engine = _default_engine()
     if (not (db and host and user)) and not engine:
         raise ValueError('SQL connection must be specified by either an engine or connection details')
 
@@ -100,7 +500,12 @@ def df_to_pg(df, table_name, engine=None, conflict='fail', dupes='include', dupe
         Engine defining the connection to the database
         'fail' causes the operation to fail if the table is found.
         'append' adds the observations onto the existing table.
-        'replace' replaces the postgres table with the data in the dataframe.
+        'replace' replaces the postgres table with the data in the dataframe. The data is loaded
+            into an unlogged '<table_name>__new' table, the existing indexes are rebuilt on it and
+            it is swapped in with a rename, so readers never see a missing or half-loaded table.
+            Grants on the old table are not carried over; use 'grant' to reapply them. Views and
+            foreign keys that depend on the old table make the replace fail, since dropping them
+            would break readers; drop and recreate them around the load.
     dupes : {'include', 'update', 'ignore'}, optional
         Engine defining the connection to the database. If not 'include', 'dupe_keys' must be 
         provided for identifying duplicates.
@@ -121,93 +526,225 @@ def df_to_pg(df, table_name, engine=None, conflict='fail', dupes='include', dupe
         Specify the types of access to grant (e.g 'UPDATE')
     '''
 
-    if engine is None:
-        engine = dw_engine
+    session = PGLoadSession(engine, grant=grant, grant_types=grant_types)
+    session.add(df, table_name, conflict=conflict, dupes=dupes, dupe_keys=dupe_keys,
+                dedupe_range=dedupe_range)
+    return session.load()[table_name]
 
-    if dupes != 'include' and len(dupe_keys) == 0:
-        raise ValueError("Cannot dedupe: no dupe_keys provided")
+def dfs_to_pg(dfs, engine=None, transaction=True, grant=None, grant_types='SELECT', **kwargs):
+    '''
+    Loads a dict of {table_name: dataframe} into Postgres in one PGLoadSession. Remaining keyword
+    arguments (conflict, dupes, etc.) are applied to every table, as in df_to_pg. Returns a dict of
+    {table_name: number of rows loaded}.
+    '''
+    session = PGLoadSession(engine, transaction=transaction, grant=grant, grant_types=grant_types)
+    for table_name, df in dfs.items():
+        session.add(df, table_name, **kwargs)
+    return session.load()
 
-    if conflict not in ['replace', 'append', 'fail']:
-        raise ValueError("'conflict' must be one of ['replace', 'append', 'fail']")
+def df_to_pg_resumable(df, table_name, spill_dir, engine=None, conflict=None, chunk_rows=500000,
+                       grant=None, grant_types='SELECT'):
+    '''
+    Loads a large dataframe into Postgres so that a failed load can pick up where it left off. The
+    dataframe is serialized once into numbered chunk files in spill_dir. Each chunk is then COPY'd
+    from a memory map into an unlogged '<table_name>__load' staging table and committed on its
+    own. Each load gets an id, and the staging table's comment stores the id together with the
+    number of committed chunks, which spill_dir/manifest.json mirrors. Calling again with the same
+    spill_dir skips the committed chunks and does not serialize the data again. Before resuming,
+    the staging table's row count is checked against the committed chunks, since Postgres empties
+    unlogged tables after a crash; a staging table that doesn't match, or that was left over from a
+    different load, is rebuilt rather than resumed. When every chunk is in, the staging table is
+    moved into table_name in one transaction that also records the load as finished in a
+    tbsu_resumable_loads table, created in table_name's schema. The spill files are removed
+    afterwards, so a retry after a crash at that point only cleans up.
+
+    Parameters
+    ----------
+    df : pandas dataframe or None
+        The dataframe to load into Postgres. May be None when resuming a load from spill_dir.
+    table_name : string
+        table name to use in the database
+    spill_dir : string
+        Directory for the chunk files and manifest. Use one directory per load.
+    engine : sql_alchemy engine, optional
+        Engine defining the connection to the database. Uses tbsu environment variables by default.
+    conflict : {'fail', 'append', 'replace'}, optional
+        As in df_to_pg. 'replace' swaps the staging table in like df_to_pg's shadow table. Defaults
+        to 'fail' for a new load and to the stored conflict when resuming.
+    chunk_rows : int, optional (default 500000)
+        Number of rows in each chunk file and committed batch
+    grant : string or array-like
+        Specify a permission group, or list of permission groups, to grant access to
+    grant_types : string or array-like, optional (default 'SELECT')
+        Specify the types of access to grant (e.g 'UPDATE')
+    '''
+
+    if engine is None:
+        engine = _default_engine()
 
     if engine is None:
         raise ValueError('No tbsu default engine. Please provide an sql_alchemy engine.')
 
-    if isinstance(grant, str):
-        grant = [grant]
+    grant = _listify(grant)
+    grant_types = _listify(grant_types)
 
-    if isinstance(grant_types, str):
-        grant_types = [grant_types]
+    manifest_file = os.path.join(spill_dir, 'manifest.json')
+    manifest = None
+    if os.path.isfile(manifest_file):
+        manifest = json.load(open(manifest_file))
+        if (manifest['table_name'] != table_name
+                or (conflict is not None and conflict != manifest['conflict'])
+                or (df is not None and (manifest['rows'] != len(df.index)
+                                        or manifest['columns'] != [str(c) for c in df.columns]))):
+            raise ValueError(f'{spill_dir} holds a different load. Please clear it or use another '
+                             + 'spill_dir.')
+        conflict = manifest['conflict']
 
-    raw = engine.raw_connection()
-    curs = raw.cursor()
+    elif df is None:
+        raise ValueError(f'No dataframe given and no load to resume in {spill_dir}')
 
-    try:
-        # Handle if table already exists
-        if engine.dialect.has_table(engine, table_name):
-            if conflict == 'fail':
-                    raise AssertionError("Table already exits")
+    elif len(df.index) == 0:
+        print('No observations in df.')
+        return 0
 
-            elif conflict == 'drop':
-                curs.execute(f"DROP TABLE IF EXISTS {table_name} cascade;")
+    conflict = conflict or 'fail'
+    _check_load_args(conflict, 'include', [])
 
-            elif conflict == 'append':
+    columns = manifest['columns'] if manifest else [str(c) for c in df.columns]
+    cols = ', '.join(columns)
 
-                # Account for differences in columns
-                server_cols = (
-                    pd.read_sql_query(f'SELECT * FROM {table_name} limit 1;', con=engine)
-                    .columns
-                )
+    raw = engine.raw_connection()
+    curs = raw.cursor()
 
-                if (set(df.columns) <= set(server_cols)):
-                    df = df.assign(**_add_cols(df, server_cols))
+    try:
+        server_cols = _catalog_columns(curs, [table_name])
+        exists = table_name in server_cols
+
+        # Staging and the bookkeeping table live in the target's schema
+        if exists:
+            qualified = _qualified_name(curs, table_name)
+            schema = qualified.split('.')[0]
+        elif '.' in table_name:
+            qualified = table_name
+            schema = table_name.split('.')[0]
+        else:
+            qualified = table_name
+            curs.execute('select current_schema();')
+            schema = curs.fetchone()[0]
+        loads_table = f'{schema}.{resumable_loads_table}'
+        staging = manifest['staging_table'] if manifest else f'{qualified}__load'
+
+        server_cols.update(_catalog_columns(curs, [staging, loads_table]))
+
+        # A load that committed but died before cleaning up its files is recorded as finished
+        finished = False
+        if manifest and loads_table in server_cols:
+            curs.execute(f"select 1 from {loads_table} where load_id = %(load_id)s;",
+                         {'load_id': manifest['load_id']})
+            finished = curs.fetchone() is not None
+
+        if not finished:
+            if exists:
+                if conflict == 'fail':
+                    raise AssertionError("Table already exits")
 
-                else: 
+                if conflict == 'append' and not set(columns) <= set(server_cols[table_name]):
                     raise ValueError('Columns found that do not exist in existing sql table.'
                                      + 'Please regenerate table with full set.')
 
-                # Dedupe
-                if dupes == 'ignore':
-                    df = _dedupe_ignore(df, dupe_keys, dedupe_range, table_name, engine)
-
-                if dupes == 'update':
-                    raise ValueError("Sorry, this isn't implemented yet :/")
-                    
-        added_obs = len(df.index)
-        if added_obs == 0:
-            print('No observations in df.')
-            return
-                    
-        #prep data for load
-        data = StringIO()
-        df.to_csv(data, header=False, index=False, sep='\u0005')
-        data.seek(0)
-
-        #create table with correct types
-        if (not engine.dialect.has_table(engine, table_name)) or (conflict == 'drop'):
-            empty_table = pd.io.sql.get_schema(df, table_name, con=engine)
-            empty_table = empty_table.replace('"', '')
-            curs.execute(empty_table)
-    
-        #populate the table
-        cols = ', '.join(df.columns)
-        sql_code = f"COPY {table_name}({cols}) FROM STDIN WITH CSV DELIMITER E'\x05';"
-        curs.copy_expert(sql=sql_code, file=data)
-        curs.connection.commit()
-        
-        #grant view permissions to analytics folks
-        if grant:
-            curs.execute(f"GRANT {', '.join(grant_types)} ON {table_name} TO {', '.join(grant)} ;")
-    
-        curs.connection.commit()
-        return added_obs
+            if manifest is None:
+                manifest = _spill_df(df, table_name, staging, conflict, spill_dir, chunk_rows,
+                                     engine)
+            load_id = manifest['load_id']
+
+            # The staging table's comment, '<load_id>:<chunks committed>', is committed with each
+            # chunk. Only resume from staging this load created, and only if it still holds those
+            # chunks' rows: unlogged tables come back empty after a crash but keep their comment.
+            committed = None
+            if staging in server_cols:
+                curs.execute("select obj_description(%(table)s::regclass, 'pg_class');",
+                             {'table': staging})
+                staged_id, _, staged_chunks = (curs.fetchone()[0] or '').partition(':')
+                if staged_id == load_id:
+                    curs.execute(f"select count(*) from {staging};")
+                    if curs.fetchone()[0] == sum(manifest['chunk_sizes'][:int(staged_chunks)]):
+                        committed = int(staged_chunks)
+
+                if committed is None:
+                    print(f'Rebuilding {staging}, which does not match this load.')
+                    curs.execute(f"DROP TABLE {staging};")
+
+            if committed is None:
+                curs.execute(manifest['create_sql'])
+                curs.execute(f"COMMENT ON TABLE {staging} IS '{load_id}:0';")
+                raw.commit()
+                committed = 0
+
+            sql_code = f"COPY {staging}({cols}) FROM STDIN WITH CSV DELIMITER E'\x05';"
+            for i in range(committed, len(manifest['chunks'])):
+                chunk_file = os.path.join(spill_dir, manifest['chunks'][i])
+                with open(chunk_file, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        curs.copy_expert(sql=sql_code, file=data)
+                curs.execute(f"COMMENT ON TABLE {staging} IS '{load_id}:{i + 1}';")
+                raw.commit()
+
+                manifest['committed'] = i + 1
+                _write_manifest(spill_dir, manifest)
+
+            # Move the staged rows into place and record the load as finished in one transaction
+            curs.execute(f"COMMENT ON TABLE {staging} IS NULL;")
+            if not exists:
+                curs.execute(f"ALTER TABLE {staging} SET LOGGED;")
+                curs.execute(f"ALTER TABLE {staging} RENAME TO {table_name.split('.')[-1]};")
+
+            elif conflict == 'replace':
+                curs.execute(f"ALTER TABLE {staging} SET LOGGED;")
+                _swap_table(curs, table_name, staging, _shadow_indexes(curs, table_name, staging))
+
+            else:
+                curs.execute(f"INSERT INTO {table_name}({cols}) SELECT {cols} FROM {staging};")
+                curs.execute(f"DROP TABLE {staging};")
+
+            if grant:
+                curs.execute(
+                    f"GRANT {', '.join(grant_types)} ON {table_name} TO {', '.join(grant)} ;"
+                )
+
+            curs.execute(f"""
+                CREATE TABLE IF NOT EXISTS {loads_table} (
+                    load_id text primary key,
+                    table_name text,
+                    rows bigint,
+                    finished_at timestamp default now()
+                );
+            """)
+            curs.execute(
+                f"INSERT INTO {loads_table} (load_id, table_name, rows) "
+                + "VALUES (%(load_id)s, %(table_name)s, %(rows)s);",
+                {'load_id': load_id, 'table_name': table_name, 'rows': manifest['rows']}
+            )
+            raw.commit()
+
+        for chunk in manifest['chunks']:
+            chunk_file = os.path.join(spill_dir, chunk)
+            if os.path.isfile(chunk_file):
+                os.remove(chunk_file)
+        os.remove(manifest_file)
+
+        # With the manifest gone nothing can resume this load, so its record can go too
+        curs.execute(f"DELETE FROM {loads_table} WHERE load_id = %(load_id)s;",
+                     {'load_id': manifest['load_id']})
+        raw.commit()
+
+        return manifest['rows']
 
     except:
         raw.rollback()
         raise
 
     finally:
-        raw.close() 
+        raw.close()
 
 #####################################
 # Initialize                        #
@@ -217,10 +754,12 @@ dw_host = os.getenv('TBSU_DW_HOST')
 dw_user = os.getenv('TBSU_DW_USER', os.getenv('USER'))
 dw_name = os.getenv('TBSU_DW_NAME')
 
-dw_engine = None
+# Records finished df_to_pg_resumable loads until their spill files are cleaned up. Created in the
+# schema of the table being loaded.
+resumable_loads_table = 'tbsu_resumable_loads'
 
-if dw_host and dw_user and dw_name:
-    set_tbsU_engine(dw_host, dw_user, dw_name)
+# Created lazily by _default_engine so importing doesn't open connection pools
+dw_engine = None
 
 
 
@@ -0,0 +1,31 @@
+import ast
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'sqlalchemy', 'requests', 'tabulate']
+
+CHECK = '''
+import sys, time
+start = time.perf_counter()
+import tbsU
+print(time.perf_counter() - start)
+print(','.join(m for m in {heavy} if m in sys.modules))
+'''
+
+
+def test_import_is_light():
+    ''' import tbsU must not pull in the heavy dependencies, and should stay quick '''
+    out = subprocess.run([sys.executable, '-c', CHECK.format(heavy=HEAVY_MODULES)],
+                         capture_output=True, text=True, check=True).stdout.split('\n')
+
+    assert out[1] == ''
+    assert float(out[0]) < 0.1
+
+
+def test_dir_lists_submodules_once():
+    out = subprocess.run([sys.executable, '-c', 'import tbsU; tbsU.alerts; print(dir(tbsU))'],
+                         capture_output=True, text=True, check=True).stdout
+    names = ast.literal_eval(out)
+
+    assert names.count('alerts') == 1
+    assert set(['alerts', 'sql', 'dfclean', 'potpourri']) <= set(names)
@@ -0,0 +1,69 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from tbsU import potpourri
+
+
+def _as_ns(values):
+    ''' datetime64[ns] integers, with NaT as the minimum int64, for exact comparisons '''
+    return pd.Series(values).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+@pytest.fixture
+def stamps():
+    ''' Random microsecond timestamps across the supported range (1925 to ~2061), plus NaT '''
+    rng = np.random.default_rng(0)
+    seconds = rng.integers(-1400000000, 2800000000, 20000)
+    micros = rng.integers(0, 10**6, 20000)
+    ns = seconds * 10**9 + micros * 1000
+    out = pd.Series(ns.view('datetime64[ns]'))
+    out[::97] = pd.NaT
+    return out
+
+
+def test_encode_matches_scalar(stamps):
+    expected = [None if pd.isna(i) else potpourri.encode64_epoch(i) for i in stamps]
+
+    result = potpourri.encode64_epoch_array(stamps)
+    assert result.dtype == object
+    assert result.tolist() == expected
+
+    array_result = potpourri.encode64_epoch_array(stamps.to_numpy())
+    assert isinstance(array_result, np.ndarray)
+    assert array_result.tolist() == expected
+
+
+def test_encode_tz_aware_matches_scalar(stamps):
+    aware = stamps.dt.tz_localize('UTC').dt.tz_convert('US/Eastern')
+    expected = [None if pd.isna(i) else potpourri.encode64_epoch(i) for i in aware]
+
+    assert potpourri.encode64_epoch_array(aware).tolist() == expected
+    assert potpourri.encode64_epoch_array(stamps).tolist() == expected
+
+
+def test_decode_matches_scalar(stamps):
+    codes = potpourri.encode64_epoch_array(stamps)
+    codes[1] = None
+
+    expected = [pd.NaT if i is None else potpourri.decode64_epoch(i) for i in codes]
+    result = potpourri.decode64_epoch_array(codes)
+    assert (_as_ns(result) == _as_ns(expected)).all()
+
+    expected = [None if i is None else potpourri.decode64_epoch(i, format_pandas=False)
+                for i in codes]
+    result = potpourri.decode64_epoch_array(codes.to_numpy(), format_pandas=False)
+    assert isinstance(result, np.ndarray)
+    assert result.tolist() == expected
+
+
+def test_decode_rejects_bad_strings():
+    with pytest.raises(ValueError):
+        potpourri.decode64_epoch_array(['AAAA*A'])
+
+    with pytest.raises(ValueError):
+        potpourri.decode64_epoch_array(['AAAAé_'])
+
+    with pytest.raises(ValueError):
+        potpourri.decode64_epoch_array(['AAAA'])